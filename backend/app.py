@@ -2,16 +2,23 @@
 Flask application handles TTB label verification requests
 """
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Request, render_template, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
+from tempfile import SpooledTemporaryFile
 import os
 import logging
-from backend.utils.ocr_processor import extract_text_from_image, test_tesseract_installation
-from backend.utils.verification import verify_label_data
+import orjson
 from dotenv import load_dotenv
 from os import environ
 
+# Load variables from the .env file before the backend modules read their settings
+load_dotenv()
+
+from backend.utils.ocr_processor import extract_text_from_image, test_tesseract_installation, warm_up_ocr
+from backend.utils.verification import verify_label_data
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -19,28 +26,53 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Load variables from the .env file
-load_dotenv()
+# Uploads up to this size are buffered in memory instead of a temporary file
+UPLOAD_SPOOL_MAX_SIZE = 8 * 1024 * 1024  # 8 MB
+
+
+class UploadRequest(Request):
+    """
+    Request class that keeps typical label uploads in memory
+    
+    Werkzeug spools any upload over 500KB to a temporary file on disk, which
+    most phone photos exceed. The image is only read once by the OCR step in
+    the same request, so memory is enough for everything but unusually large files.
+    """
+    
+    def _get_file_stream(self, total_content_length, content_type,
+                         filename=None, content_length=None):
+        return SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_SIZE, mode='rb+')
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider that serializes responses with orjson instead of the stdlib json module
+    """
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 # Initialize Flask app
 app = Flask(__name__, 
             template_folder='../frontend/templates',
             static_folder='../frontend/static')
+app.request_class = UploadRequest
+app.json = ORJSONProvider(app)
 
 # Enable CORS for development
 CORS(app)
 
 # Configuration
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16 MB max file size
-app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['SECRET_KEY'] = environ.get('SECRET_KEY', 'default-fallback-key')
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 
-# Create necessary directories
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
 def allowed_file(filename):
     """
     Check if the uploaded file has an allowed extension
@@ -154,58 +186,48 @@ def verify_label():
                 'error': 'Alcohol content must be a valid number'
             }), 400
         
-        # Save uploaded file temporarily
+        # Read the upload straight from the request stream, no temporary file
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        logger.info(f"File saved temporarily: {filepath}")
         
-        try:
-            # Extract text from image using OCR (Tesseract)
-            logger.info("Starting OCR text extraction...")
-            extracted_text = extract_text_from_image(filepath)
-            
-            logger.info(f"OCR extraction completed: {len(extracted_text)} characters")
-            logger.debug(f"Extracted text preview:\n{extracted_text[:300]}...")
-            
-            # Check if sufficient text was extracted
-            if not extracted_text or len(extracted_text.strip()) < 50:
-                logger.warning("Insufficient text extracted from image")
-                return jsonify({
-                    'error': 'Could not read sufficient text from the label image. '
-                            'Please ensure the image is clear, well-lit, and contains readable text. '
-                            'Try taking a higher quality photo or using a clearer image.'
-                }), 400
-            
-            # Verify label data against form inputs
-            logger.info("Starting label verification...")
-            verification_results = verify_label_data(form_data, extracted_text)
-            
-            # Log results summary
-            match_count = sum(1 for v in verification_results if v['status'] == 'match')
-            total_count = len(verification_results)
-            logger.info(f"Verification completed: {match_count}/{total_count} checks passed")
-            
-            for result in verification_results:
-                logger.info(f"  - {result['field']}: {result['status']}")
-            
-            # Return results
-            response = {
-                'success': True,
-                'verifications': verification_results,
-                'extracted_text': extracted_text[:1000]  # Limit to first 1000 chars
-            }
-            
-            logger.info("Request processed successfully")
-            logger.info("=" * 60)
-            
-            return jsonify(response), 200
+        # Extract text from image using OCR (Tesseract)
+        logger.info("Starting OCR text extraction...")
+        extracted_text = extract_text_from_image(file.stream, filename=filename)
+        
+        logger.info(f"OCR extraction completed: {len(extracted_text)} characters")
+        logger.debug(f"Extracted text preview:\n{extracted_text[:300]}...")
+        
+        # Check if sufficient text was extracted
+        if not extracted_text or len(extracted_text.strip()) < 50:
+            logger.warning("Insufficient text extracted from image")
+            return jsonify({
+                'error': 'Could not read sufficient text from the label image. '
+                        'Please ensure the image is clear, well-lit, and contains readable text. '
+                        'Try taking a higher quality photo or using a clearer image.'
+            }), 400
         
-        finally:
-            # Clean up temporary file
-            if os.path.exists(filepath):
-                os.remove(filepath)
-                logger.info(f"Cleaned up temporary file: {filepath}")
+        # Verify label data against form inputs
+        logger.info("Starting label verification...")
+        verification_results = verify_label_data(form_data, extracted_text)
+        
+        # Log results summary
+        match_count = sum(1 for v in verification_results if v['status'] == 'match')
+        total_count = len(verification_results)
+        logger.info(f"Verification completed: {match_count}/{total_count} checks passed")
+        
+        for result in verification_results:
+            logger.info(f"  - {result['field']}: {result['status']}")
+        
+        # Return results
+        response = {
+            'success': True,
+            'verifications': verification_results,
+            'extracted_text': extracted_text[:1000]  # Limit to first 1000 chars
+        }
+        
+        logger.info("Request processed successfully")
+        logger.info("=" * 60)
+        
+        return jsonify(response), 200
     
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}", exc_info=True)
@@ -283,12 +305,8 @@ def startup_checks():
         logger.error("  Edit backend/utils/ocr_processor.py and uncomment:")
         logger.error("  pytesseract.pytesseract.tesseract_cmd = r'C:\\Program Files\\Tesseract-OCR\\tesseract.exe'")
     
-    # Check upload directory
-    if os.path.exists(app.config['UPLOAD_FOLDER']):
-        logger.info(f"✓ Upload directory exists: {app.config['UPLOAD_FOLDER']}")
-    else:
-        logger.info(f"Creating upload directory: {app.config['UPLOAD_FOLDER']}")
-        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    # Warm up OCR so the first request is not slowed by engine start-up
+    warm_up_ocr()
     
     logger.info("=" * 60)
     logger.info("Server is ready!")
@@ -4,12 +4,56 @@ OCR Processor handles text extraction from label images using Tesseract OCR
 
 import pytesseract
 from PIL import Image
+from io import BytesIO
+from collections import OrderedDict
+from contextlib import contextmanager
+from queue import Queue, Empty, Full
+import hashlib
+import threading
 import os
 import sys
 import logging
 
+# tesserocr binds libtesseract in-process and is used when available,
+# otherwise pytesseract runs the tesseract binary for every image
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
 logger = logging.getLogger(__name__)
 
+# Tesseract settings used for label text extraction
+# --psm 6: Assume a single uniform block of text
+# --oem 3: Use both legacy and LSTM OCR engine modes
+OCR_CONFIG = r'--oem 3 --psm 6'
+
+# Maximum number of OCR results kept in the in-memory cache
+OCR_CACHE_MAX_ENTRIES = 1024
+
+# OCR results keyed by image content hash and Tesseract settings
+_ocr_cache = OrderedDict()
+_ocr_cache_lock = threading.Lock()
+
+# Per-image locks so concurrent uploads of the same image share one OCR run
+_ocr_inflight = {}
+
+# Cap on concurrent Tesseract runs so bursts of uploads do not oversubscribe the CPU.
+# The cap is per process, so by default the CPUs are split across Gunicorn workers
+OCR_MAX_INFLIGHT = int(os.environ.get(
+    'OCR_MAX_INFLIGHT',
+    max(1, (os.cpu_count() or 1) // max(1, int(os.environ.get('WEB_CONCURRENCY', 1))))
+))
+_ocr_semaphore = threading.BoundedSemaphore(OCR_MAX_INFLIGHT)
+
+# Warm tesserocr engines reused across requests, one per allowed concurrent run
+_engine_pool = Queue(maxsize=OCR_MAX_INFLIGHT)
+
+# Small images are first read at native size, which is much cheaper than the
+# upscaled pass; the upscaled pass only runs if that result looks unreliable
+FAST_PASS_MIN_CONFIDENCE = 75
+FAST_PASS_MIN_TEXT_LENGTH = 50
+
 # Configure Tesseract path based on OS
 if sys.platform == 'win32':
     # Windows
@@ -22,12 +66,17 @@ else:
     # Tesseract installed via: apt-get install tesseract-ocr
     pytesseract.pytesseract.tesseract_cmd = r'/usr/bin/tesseract'
 
-def extract_text_from_image(image_path):
+def extract_text_from_image(image_source, filename=None):
     """
     Extract text from an image using Tesseract OCR
     
+    Results are cached by image content hash, so repeat submissions of the
+    same label image skip the OCR run entirely.
+    
     Args:
-        image_path (str): Path to the image file
+        image_source (bytes | file-like | str): Image data, a readable file
+            object (such as an uploaded file stream), or a path to the image file
+        filename (str): Optional name of the image, used for logging
         
     Returns:
         str: Extracted text from the image
@@ -36,36 +85,32 @@ def extract_text_from_image(image_path):
         Exception: If OCR processing fails
     """
     try:
-        logger.info(f"Starting OCR processing for: {image_path}")
-        
-        # Verify file exists
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"Image file not found: {image_path}")
-        
-        # Open image with PIL
-        image = Image.open(image_path)
-        logger.info(f"Image opened successfully. Size: {image.size}, Mode: {image.mode}")
-        
-        # Preprocess image for better OCR results
-        processed_image = preprocess_image(image)
-        
-        # Configure OCR settings for better accuracy
-        # --psm 6: Assume a single uniform block of text
-        # --oem 3: Use both legacy and LSTM OCR engine modes
-        custom_config = r'--oem 3 --psm 6'
-        
-        # Extract text using Tesseract
-        extracted_text = pytesseract.image_to_string(
-            processed_image,
-            config=custom_config
-        )
+        image_name = filename or (image_source if isinstance(image_source, str) else 'uploaded image')
+        logger.info(f"Starting OCR processing for: {image_name}")
         
-        logger.info(f"OCR completed. Extracted {len(extracted_text)} characters")
-        logger.debug(f"Extracted text preview: {extracted_text[:200]}...")
-        
-        if not extracted_text or len(extracted_text.strip()) < 5:
-            logger.warning("Very little text extracted from image")
-            raise ValueError("Could not extract sufficient text from the image. The image may be unclear or not contain readable text.")
+        # Hash and decode the same file object without copying the image into new bytes
+        with _open_image_source(image_source) as image_file:
+            cache_key = _get_cache_key(image_file)
+            cached_text = _get_cached_text(cache_key)
+            if cached_text is not None:
+                logger.info(f"OCR cache hit. Returning {len(cached_text)} cached characters")
+                return cached_text
+            
+            with _single_flight(cache_key):
+                # Another request may have finished the same image while we waited
+                cached_text = _get_cached_text(cache_key)
+                if cached_text is not None:
+                    logger.info(f"OCR cache hit. Returning {len(cached_text)} cached characters")
+                    return cached_text
+                
+                with _ocr_semaphore:
+                    extracted_text = _run_ocr(image_file)
+                
+                if not extracted_text or len(extracted_text.strip()) < 5:
+                    logger.warning("Very little text extracted from image")
+                    raise ValueError("Could not extract sufficient text from the image. The image may be unclear or not contain readable text.")
+                
+                _store_cached_text(cache_key, extracted_text)
         
         return extracted_text
     
@@ -82,30 +127,305 @@ def extract_text_from_image(image_path):
         raise
 
 
-def preprocess_image(image):
+@contextmanager
+def _open_image_source(image_source):
+    """
+    Open bytes, a file-like object, or a file path as a seekable binary file
+    
+    Args:
+        image_source (bytes | file-like | str): Image data source
+        
+    Yields:
+        file-like: Seekable binary file positioned at the start of the image
+    """
+    if isinstance(image_source, (bytes, bytearray)):
+        yield BytesIO(image_source)
+    
+    elif hasattr(image_source, 'read'):
+        # Upload streams are seekable; anything else is buffered once
+        if hasattr(image_source, 'seekable') and image_source.seekable():
+            image_source.seek(0)
+            yield image_source
+        else:
+            yield BytesIO(image_source.read())
+    
+    else:
+        # Verify file exists
+        if not os.path.exists(image_source):
+            raise FileNotFoundError(f"Image file not found: {image_source}")
+        
+        with open(image_source, 'rb') as image_file:
+            yield image_file
+
+
+def _run_ocr(image_file):
+    """
+    Run Tesseract OCR on an encoded image file
+    
+    Args:
+        image_file (file-like): Seekable binary file containing the image
+        
+    Returns:
+        str: Extracted text from the image
+    """
+    # Open image with PIL
+    image_file.seek(0)
+    image = Image.open(image_file)
+    logger.info(f"Image opened successfully. Size: {image.size}, Mode: {image.mode}")
+    
+    # Try a cheap pass at native size before paying for the upscaled one
+    if _get_scale_factor(*image.size) > 1:
+        fast_image = preprocess_image(image, allow_upscale=False)
+        
+        # A single-colour image has no text for either pass to find
+        extrema = fast_image.getextrema()
+        if not isinstance(extrema[0], tuple):
+            extrema = (extrema,)
+        if all(low == high for low, high in extrema):
+            logger.info("Image is a single colour, skipping OCR")
+            return ''
+        
+        extracted_text, mean_confidence = _recognize_text_with_confidence(fast_image)
+        
+        if (mean_confidence >= FAST_PASS_MIN_CONFIDENCE and
+                len(extracted_text.strip()) >= FAST_PASS_MIN_TEXT_LENGTH):
+            logger.info(f"Fast OCR pass accepted (mean confidence {mean_confidence:.0f})")
+            logger.info(f"OCR completed. Extracted {len(extracted_text)} characters")
+            return extracted_text
+        
+        logger.info(f"Fast OCR pass unreliable (mean confidence {mean_confidence:.0f}), retrying upscaled")
+    
+    # Preprocess image for better OCR results
+    processed_image = preprocess_image(image)
+    
+    # Extract text using Tesseract
+    if tesserocr is not None:
+        extracted_text = _run_pooled_engine(processed_image)
+    else:
+        extracted_text = pytesseract.image_to_string(
+            processed_image,
+            config=OCR_CONFIG
+        )
+    
+    logger.info(f"OCR completed. Extracted {len(extracted_text)} characters")
+    logger.debug(f"Extracted text preview: {extracted_text[:200]}...")
+    
+    return extracted_text
+
+
+def _recognize_text_with_confidence(image):
+    """
+    Run OCR on a preprocessed image and report the mean word confidence
+    
+    Args:
+        image (PIL.Image): Preprocessed image
+        
+    Returns:
+        tuple: Extracted text and mean word confidence (0-100)
+    """
+    if tesserocr is not None:
+        return _run_pooled_engine(image, with_confidence=True)
+    
+    # One tesseract run writes both the plain text (exactly what image_to_string
+    # returns) and the TSV word data the confidences come from
+    with pytesseract.pytesseract.save(image) as (temp_name, input_filename):
+        pytesseract.pytesseract.run_tesseract(
+            input_filename,
+            temp_name,
+            'txt',
+            None,
+            config=f'-c tessedit_create_tsv=1 {OCR_CONFIG}'
+        )
+        with open(f'{temp_name}.txt', 'rb') as text_file:
+            extracted_text = text_file.read().decode('utf-8')
+        with open(f'{temp_name}.tsv', 'rb') as data_file:
+            ocr_data = pytesseract.pytesseract.file_to_dict(data_file.read().decode('utf-8'), '\t', -1)
+    
+    return extracted_text, _mean_confidence(ocr_data.get('conf', []))
+
+
+def _mean_confidence(confidences):
+    """
+    Average the word confidences Tesseract reported
+    
+    Args:
+        confidences (list): Per-word confidences (0-100); -1 marks non-word rows
+        
+    Returns:
+        float: Mean of the confidences above 0, or 0 when there are none
+    """
+    confidences = [float(conf) for conf in confidences if float(conf) > 0]
+    return sum(confidences) / len(confidences) if confidences else 0
+
+
+def _create_engine():
+    """
+    Create a tesserocr engine with the same settings as OCR_CONFIG
+    
+    Returns:
+        tesserocr.PyTessBaseAPI: A new engine with the language data loaded
+    """
+    # Same settings as OCR_CONFIG: --oem 3 --psm 6
+    engine = tesserocr.PyTessBaseAPI(
+        psm=tesserocr.PSM.SINGLE_BLOCK,
+        oem=tesserocr.OEM.DEFAULT
+    )
+    logger.info("Created new tesserocr engine")
+    return engine
+
+
+def _run_pooled_engine(image, with_confidence=False):
+    """
+    Run OCR on a preprocessed image with a warm tesserocr engine from the pool
+    
+    Args:
+        image (PIL.Image): Preprocessed image
+        with_confidence (bool): Also return the mean word confidence
+        
+    Returns:
+        str: Extracted text from the image, or a (text, confidence) tuple
+            when with_confidence is set
+    """
+    try:
+        engine = _engine_pool.get_nowait()
+    except Empty:
+        engine = _create_engine()
+    
+    try:
+        engine.SetImage(image)
+        extracted_text = engine.GetUTF8Text()
+        if with_confidence:
+            return extracted_text, _mean_confidence(engine.AllWordConfidences())
+        return extracted_text
+    finally:
+        engine.Clear()
+        try:
+            _engine_pool.put_nowait(engine)
+        except Full:
+            # warm_up_ocr already filled the pool while this engine was out
+            engine.End()
+
+
+def _get_cache_key(image_file):
+    """
+    Build the OCR cache key for an image
+    
+    The key combines a content hash of the image with the Tesseract settings,
+    so changing the OCR configuration invalidates earlier results.
+    
+    Args:
+        image_file (file-like): Seekable binary file containing the image
+        
+    Returns:
+        tuple: Cache key for the image
+    """
+    image_hash = hashlib.blake2b(digest_size=16)
+    image_file.seek(0)
+    for chunk in iter(lambda: image_file.read(64 * 1024), b''):
+        image_hash.update(chunk)
+    image_file.seek(0)
+    return (image_hash.hexdigest(), OCR_CONFIG)
+
+
+def _get_cached_text(cache_key):
+    """Return cached OCR text for the key, or None on a cache miss"""
+    with _ocr_cache_lock:
+        cached_text = _ocr_cache.get(cache_key)
+        if cached_text is not None:
+            _ocr_cache.move_to_end(cache_key)
+        return cached_text
+
+
+def _store_cached_text(cache_key, text):
+    """Store OCR text in the cache, evicting the least recently used entry"""
+    with _ocr_cache_lock:
+        _ocr_cache[cache_key] = text
+        _ocr_cache.move_to_end(cache_key)
+        while len(_ocr_cache) > OCR_CACHE_MAX_ENTRIES:
+            _ocr_cache.popitem(last=False)
+
+
+@contextmanager
+def _single_flight(cache_key):
+    """
+    Serialize OCR runs for the same image so duplicates wait for the first
+    
+    Args:
+        cache_key (tuple): Cache key of the image being processed
+    """
+    with _ocr_cache_lock:
+        key_lock = _ocr_inflight.setdefault(cache_key, threading.Lock())
+    
+    with key_lock:
+        try:
+            yield
+        finally:
+            with _ocr_cache_lock:
+                if _ocr_inflight.get(cache_key) is key_lock:
+                    del _ocr_inflight[cache_key]
+
+
+def _get_scale_factor(width, height):
+    """
+    Work out how much an image should be resized before OCR
+    
+    Args:
+        width (int): Image width in pixels
+        height (int): Image height in pixels
+        
+    Returns:
+        float: Scale factor, above 1 to upscale and below 1 to downscale
+    """
+    # Resize image if it's too small and improves OCR accuracy
+    min_dimension = 1000
+    
+    # Large phone photos are shrunk so the long edge is at most max_dimension,
+    # which is plenty for label text and makes Tesseract much faster
+    max_dimension = 2000
+    
+    if max(width, height) > max_dimension:
+        return max(max_dimension / max(width, height),
+                   min_dimension / min(width, height))
+    elif width < min_dimension or height < min_dimension:
+        return max(min_dimension / width, min_dimension / height)
+    else:
+        return 1
+
+
+def preprocess_image(image, allow_upscale=True):
     """
     Preprocess image to improve OCR accuracy
     
     Args:
         image (PIL.Image): Input image
+        allow_upscale (bool): Enlarge small images; when False they keep their native size
         
     Returns:
         PIL.Image: Preprocessed image
     """
     try:
+        width, height = image.size
+        scale_factor = _get_scale_factor(width, height)
+        if not allow_upscale:
+            scale_factor = min(scale_factor, 1)
+        
+        new_width = int(width * scale_factor)
+        new_height = int(height * scale_factor)
+        
+        # For JPEGs that are being shrunk, let the decoder skip detail we would
+        # throw away anyway by decoding at a reduced scale no smaller than the target
+        if scale_factor < 1 and image.format == 'JPEG':
+            image.draft('RGB', (new_width, new_height))
+        
         # Convert to RGB if necessary
         if image.mode != 'RGB':
             image = image.convert('RGB')
         
-        # Resize image if it's too small and improves OCR accuracy
-        width, height = image.size
-        min_dimension = 1000
-        
-        if width < min_dimension or height < min_dimension:
-            scale_factor = max(min_dimension / width, min_dimension / height)
-            new_width = int(width * scale_factor)
-            new_height = int(height * scale_factor)
-            image = image.resize((new_width, new_height), Image.LANCZOS)
+        if image.size != (new_width, new_height):
+            # Small images are enlarged with BICUBIC, which is cheaper than LANCZOS;
+            # reducing_gap shrinks large images with a fast box reduce before LANCZOS
+            resample = Image.BICUBIC if scale_factor > 1 else Image.LANCZOS
+            image = image.resize((new_width, new_height), resample, reducing_gap=2.0)
             logger.info(f"Image resized to: {new_width}x{new_height}")
         
         return image
@@ -159,6 +479,42 @@ def extract_text_with_confidence(image_path):
         raise
 
 
+def warm_up_ocr():
+    """
+    Prime image codecs and the OCR engine so the first request does not pay
+    for loading them
+    
+    Returns:
+        bool: True if warm-up succeeded
+    """
+    try:
+        # Register all PIL image plugins up front
+        Image.init()
+        
+        # Every engine loads its own language data, so create one per allowed
+        # concurrent run up front
+        if tesserocr is not None:
+            while not _engine_pool.full():
+                try:
+                    _engine_pool.put_nowait(_create_engine())
+                except Full:
+                    break
+        
+        # One tiny OCR run loads any remaining lazy state
+        blank_image = Image.new('RGB', (64, 64), 'white')
+        with _ocr_semaphore:
+            if tesserocr is not None:
+                _run_pooled_engine(blank_image)
+            else:
+                pytesseract.image_to_string(blank_image, config=OCR_CONFIG)
+        
+        logger.info("OCR engine warmed up")
+        return True
+    except Exception as e:
+        logger.warning(f"OCR warm-up failed: {str(e)}")
+        return False
+
+
 def test_tesseract_installation():
     """
     Test if Tesseract is properly installed and accessible
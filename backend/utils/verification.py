@@ -1,10 +1,21 @@
 """
 Verification compares form data with extracted OCR text from label images
+
+All regex patterns and lookup tables are built once at import and only read
+afterwards, so the module can be shared by threads serving concurrent requests.
 """
 
 import re
 import logging
 from difflib import SequenceMatcher
+from functools import lru_cache
+
+# RapidFuzz runs fuzzy matching in C++; difflib is used when it is not installed.
+# RapidFuzz's ratio uses the optimal alignment, so it is never below difflib's
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:
+    fuzz = process = None
 
 logger = logging.getLogger(__name__)
 
@@ -19,11 +30,50 @@ GOVERNMENT_WARNING_KEYWORDS = [
     "IMPAIRS YOUR ABILITY"
 ]
 
+# Matches every warning keyword in one pass over the text; the lookahead keeps
+# matches zero-width so overlapping keywords (like "SURGEON GENERAL" inside
+# "ACCORDING TO THE SURGEON GENERAL") are all found
+GOVERNMENT_WARNING_PATTERN = re.compile(
+    '(?=(' + '|'.join(re.escape(keyword) for keyword in GOVERNMENT_WARNING_KEYWORDS) + '))'
+)
+
+# Translation table for normalize_text: deletes every ASCII character except
+# lowercase letters, digits, spaces, and the punctuation kept for comparison
+NORMALIZE_KEEP_CHARS = frozenset('abcdefghijklmnopqrstuvwxyz0123456789 %.-/')
+NORMALIZE_TABLE = str.maketrans({chr(c): None for c in range(128) if chr(c) not in NORMALIZE_KEEP_CHARS})
+
+# Alcohol content pattern, compiled once at import so the text is scanned in one pass
+# Patterns: "45%", "45 %", "45.0%", "45% ABV", "ABV 45%", "Alc. 45% Vol."
+PERCENTAGE_PATTERN = re.compile(
+    r'(?:abv[:\s]*'  # ABV: 45 or ABV 45
+    r'|alcohol[:\s]*'  # Alcohol: 45
+    r'|alc[.:\s]*'  # Alc. 45 or Alc: 45
+    r')(\d+(?:\.\d*)?)'
+    r'|(\d+(?:\.\d*)?)\s*(?:%|percent)'  # Basic percentage or written as "percent"
+)
+
+# Net contents volume patterns, compiled once at import
+# Patterns: "750ml", "750 ml", "750mL", "12 fl oz", "1L", "1 liter"
+VOLUME_PATTERNS = [
+    re.compile(r'(\d+(?:\.\d*)?)\s*(ml|milliliter|millilitre)'),
+    re.compile(r'(\d+(?:\.\d*)?)\s*(l|liter|litre)'),
+    re.compile(r'(\d+(?:\.\d*)?)\s*(oz|ounce)'),
+    re.compile(r'(\d+(?:\.\d*)?)\s*(fl\s*oz|fluid\s*ounce)'),
+    re.compile(r'(\d+(?:\.\d*)?)\s*(cl|centiliter)'),
+]
+
+# Number and unit from the net contents form field, like "750 ml"
+FORM_VOLUME_PATTERN = re.compile(r'(\d+(?:\.\d*)?)\s*([a-z]+)')
 
+
+@lru_cache(maxsize=256)
 def normalize_text(text):
     """
     Normalize text for comparison by removing extra whitespace and converting to lowercase
     
+    Results are cached, since the same form values and OCR text are normalized
+    repeatedly while a label is verified.
+    
     Args:
         text (str): Input text
         
@@ -33,21 +83,22 @@ def normalize_text(text):
     if not text:
         return ""
     
-    # Convert to lowercase
-    text = text.lower()
-    
-    # Replace multiple whitespaces with single space
-    text = re.sub(r'\s+', ' ', text)
+    # Convert to lowercase and replace multiple whitespaces with single space
+    text = ' '.join(text.lower().split())
     
     # Remove special characters but keep alphanumeric, spaces, %, and common punctuation
-    text = re.sub(r'[^a-z0-9\s%.\-/]', '', text)
+    text = text.translate(NORMALIZE_TABLE)
+    
+    # The table only covers ASCII, so drop any remaining non-ASCII characters
+    if not text.isascii():
+        text = text.encode('ascii', 'ignore').decode('ascii')
     
     return text.strip()
 
 
 def fuzzy_match(text1, text2, threshold=0.8):
     """
-    Perform fuzzy string matching using sequence matcher
+    Perform fuzzy string matching using RapidFuzz, or difflib's sequence matcher as a fallback
     
     Args:
         text1 (str): First text to compare
@@ -57,12 +108,19 @@ def fuzzy_match(text1, text2, threshold=0.8):
     Returns:
         bool: True if texts are similar above threshold
     """
-    ratio = SequenceMatcher(None, text1, text2).ratio()
+    if fuzz is not None:
+        ratio = fuzz.ratio(text1, text2) / 100
+    else:
+        matcher = SequenceMatcher(None, text1, text2)
+        # Cheap upper bounds reject most pairs before the full ratio is computed
+        if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+            return False
+        ratio = matcher.ratio()
     logger.debug(f"Fuzzy match ratio: {ratio:.2f} for '{text1}' vs '{text2}'")
     return ratio >= threshold
 
 
-def contains_text(haystack, needle, fuzzy=True, threshold=0.8):
+def contains_text(haystack, needle, fuzzy=True, threshold=0.8, haystack_norm=None):
     """
     Check if needle text is contained in haystack with optional fuzzy matching
     
@@ -71,11 +129,13 @@ def contains_text(haystack, needle, fuzzy=True, threshold=0.8):
         needle (str): Text to search for
         fuzzy (bool): Use fuzzy matching
         threshold (float): Fuzzy match threshold
+        haystack_norm (str): Already normalized haystack, if available
         
     Returns:
         bool: True if needle is found in haystack
     """
-    haystack_norm = normalize_text(haystack)
+    if haystack_norm is None:
+        haystack_norm = normalize_text(haystack)
     needle_norm = normalize_text(needle)
     
     # Reject empty or too-short normalized text
@@ -90,6 +150,13 @@ def contains_text(haystack, needle, fuzzy=True, threshold=0.8):
     
     # Fuzzy matching: check if needle matches any portion of haystack
     if fuzzy:
+        # A similarity ratio can be at most 2*min(a, b) / (a + b), so a haystack
+        # this much shorter than the needle can never reach the threshold
+        # (computed the same way as difflib's real_quick_ratio)
+        shortest = min(len(haystack_norm), len(needle_norm))
+        if 2.0 * shortest / (shortest + len(needle_norm)) < threshold:
+            return False
+        
         # Split haystack into words/phrases and check against needle
         words = haystack_norm.split()
         
@@ -97,12 +164,44 @@ def contains_text(haystack, needle, fuzzy=True, threshold=0.8):
         needle_words = needle_norm.split()
         needle_len = len(needle_words)
         
-        # Prevent empty needle_words
-        if needle_len == 0:
+        # Prevent empty needle_words, and skip haystacks with fewer words than the needle
+        # (a single-word needle that is a whole haystack word was already an exact match)
+        if needle_len == 0 or needle_len > len(words):
+            return False
+        
+        # Character offsets of each word in the single-spaced text, so every
+        # window is one slice instead of a fresh join of its words
+        spaced_text = ' '.join(words)
+        word_starts = []
+        word_ends = []
+        position = 0
+        for word in words:
+            word_starts.append(position)
+            position += len(word)
+            word_ends.append(position)
+            position += 1
+        window_bounds = list(zip(word_starts, word_ends[needle_len - 1:]))
+        
+        # RapidFuzz scores every window in a single C++ call
+        if fuzz is not None:
+            phrases = [spaced_text[start:end] for start, end in window_bounds]
+            best_match = process.extractOne(
+                needle_norm, phrases, scorer=fuzz.ratio, score_cutoff=round(threshold * 100, 2)
+            )
+            if best_match:
+                logger.debug(f"Fuzzy match found: '{best_match[0]}' matches '{needle}'")
+                return True
             return False
         
-        for i in range(len(words) - needle_len + 1):
-            phrase = ' '.join(words[i:i + needle_len])
+        # Skip phrases whose length alone rules out the threshold, because the
+        # ratio is at most 2*min(a, b) / (a + b)
+        needle_chars = len(needle_norm)
+        
+        for start, end in window_bounds:
+            phrase_len = end - start
+            if 2.0 * min(phrase_len, needle_chars) / (phrase_len + needle_chars) < threshold:
+                continue
+            phrase = spaced_text[start:end]
             if fuzzy_match(phrase, needle_norm, threshold):
                 logger.debug(f"Fuzzy match found: '{phrase}' matches '{needle}'")
                 return True
@@ -110,13 +209,14 @@ def contains_text(haystack, needle, fuzzy=True, threshold=0.8):
     return False
 
 
-def verify_brand_name(form_brand, extracted_text):
+def verify_brand_name(form_brand, extracted_text, text_norm=None):
     """
     Verify if brand name from form appears in extracted text
     
     Args:
         form_brand (str): Brand name from form
         extracted_text (str): OCR extracted text
+        text_norm (str): Already normalized extracted text, if available
         
     Returns:
         dict: Verification result
@@ -146,7 +246,7 @@ def verify_brand_name(form_brand, extracted_text):
         }
     
     # Use stricter 90% threshold
-    if contains_text(extracted_text, form_brand, fuzzy=True, threshold=0.90):
+    if contains_text(extracted_text, form_brand, fuzzy=True, threshold=0.90, haystack_norm=text_norm):
         return {
             'field': 'Brand Name',
             'status': 'match',
@@ -160,13 +260,14 @@ def verify_brand_name(form_brand, extracted_text):
         }
 
 
-def verify_product_type(form_type, extracted_text):
+def verify_product_type(form_type, extracted_text, text_norm=None):
     """
     Verify if product class/type from form appears in extracted text
     
     Args:
         form_type (str): Product type from form
         extracted_text (str): OCR extracted text
+        text_norm (str): Already normalized extracted text, if available
         
     Returns:
         dict: Verification result
@@ -195,8 +296,11 @@ def verify_product_type(form_type, extracted_text):
             'is_match': False
         }
     
+    if text_norm is None:
+        text_norm = normalize_text(extracted_text)
+    
     # Use stricter 80% threshold
-    if contains_text(extracted_text, form_type, fuzzy=True, threshold=0.80):
+    if contains_text(extracted_text, form_type, fuzzy=True, threshold=0.80, haystack_norm=text_norm):
         return {
             'field': 'Product Class/Type',
             'status': 'match',
@@ -207,7 +311,7 @@ def verify_product_type(form_type, extracted_text):
         words = form_type.lower().split()
         if len(words) > 2:
             # Check if at least the key words are present
-            key_words_found = sum(1 for word in words if len(word) > 3 and word in normalize_text(extracted_text))
+            key_words_found = sum(1 for word in words if len(word) > 3 and word in text_norm)
             if key_words_found >= len(words) // 2:
                 return {
                     'field': 'Product Class/Type',
@@ -238,31 +342,18 @@ def verify_alcohol_content(form_abv, extracted_text):
         # Convert form ABV to float
         form_abv_float = float(form_abv)
         
-        # Find all percentage patterns in extracted text
-        # Patterns: "45%", "45 %", "45.0%", "45% ABV", "ABV 45%", "Alc. 45% Vol."
-        percentage_patterns = [
-            r'(\d+\.?\d*)\s*%',  # Basic percentage
-            r'(\d+\.?\d*)\s*percent',  # Written as "percent"
-            r'abv[:\s]*(\d+\.?\d*)',  # ABV: 45 or ABV 45
-            r'alcohol[:\s]*(\d+\.?\d*)',  # Alcohol: 45
-            r'alc[.:\s]*(\d+\.?\d*)',  # Alc. 45 or Alc: 45
-        ]
-        
-        found_percentages = []
+        found_percentages = set()
         text_lower = extracted_text.lower()
         
-        for pattern in percentage_patterns:
-            matches = re.findall(pattern, text_lower)
-            for match in matches:
-                try:
-                    percentage = float(match)
-                    if 0 <= percentage <= 100:  # Valid percentage range
-                        found_percentages.append(percentage)
-                except ValueError:
-                    continue
+        # Find all percentage patterns in extracted text
+        for match in PERCENTAGE_PATTERN.finditer(text_lower):
+            try:
+                percentage = float(match.group(1) or match.group(2))
+                if 0 <= percentage <= 100:  # Valid percentage range
+                    found_percentages.add(percentage)
+            except ValueError:
+                continue
         
-        # Remove duplicates
-        found_percentages = list(set(found_percentages))
         logger.debug(f"Found percentages in text: {found_percentages}")
         
         # Check if form ABV matches any found percentage (with tolerance)
@@ -277,10 +368,12 @@ def verify_alcohol_content(form_abv, extracted_text):
         
         # If percentages found but don't match
         if found_percentages:
+            # Report the value closest to the expected one
+            closest_abv = min(found_percentages, key=lambda found_abv: abs(form_abv_float - found_abv))
             return {
                 'field': 'Alcohol Content',
                 'status': 'mismatch',
-                'message': f"✗ Expected {form_abv}% but found {found_percentages[0]}% on the label."
+                'message': f"✗ Expected {form_abv}% but found {closest_abv}% on the label."
             }
         else:
             return {
@@ -298,13 +391,14 @@ def verify_alcohol_content(form_abv, extracted_text):
         }
 
 
-def verify_net_contents(form_contents, extracted_text):
+def verify_net_contents(form_contents, extracted_text, text_norm=None):
     """
     Verify if net contents from form appears in extracted text
     
     Args:
         form_contents (str): Net contents from form
         extracted_text (str): OCR extracted text
+        text_norm (str): Already normalized extracted text, if available
         
     Returns:
         dict: Verification result or None if not provided
@@ -317,20 +411,13 @@ def verify_net_contents(form_contents, extracted_text):
     # Normalize the form contents (like "750ml", "750 ml", "750 mL" should all match)
     form_normalized = normalize_text(form_contents)
     
-    # Extract volume patterns from text
-    # Patterns: "750ml", "750 ml", "750mL", "12 fl oz", "1L", "1 liter"
-    volume_patterns = [
-        r'(\d+\.?\d*)\s*(ml|milliliter|millilitre)',
-        r'(\d+\.?\d*)\s*(l|liter|litre)',
-        r'(\d+\.?\d*)\s*(oz|ounce)',
-        r'(\d+\.?\d*)\s*(fl\s*oz|fluid\s*ounce)',
-        r'(\d+\.?\d*)\s*(cl|centiliter)',
-    ]
-    
     text_lower = extracted_text.lower()
     
+    if text_norm is None:
+        text_norm = normalize_text(extracted_text)
+    
     # Check for direct match first
-    if form_normalized in normalize_text(extracted_text):
+    if form_normalized in text_norm:
         return {
             'field': 'Net Contents',
             'status': 'match',
@@ -338,14 +425,14 @@ def verify_net_contents(form_contents, extracted_text):
         }
     
     # Extract number and unit from form input
-    form_match = re.search(r'(\d+\.?\d*)\s*([a-z]+)', form_normalized)
+    form_match = FORM_VOLUME_PATTERN.search(form_normalized)
     if form_match:
         form_num = float(form_match.group(1))
         form_unit = form_match.group(2)
         
         # Search for similar volume in text
-        for pattern in volume_patterns:
-            matches = re.findall(pattern, text_lower)
+        for pattern in VOLUME_PATTERNS:
+            matches = pattern.findall(text_lower)
             for match in matches:
                 try:
                     found_num = float(match[0])
@@ -374,43 +461,45 @@ def verify_net_contents(form_contents, extracted_text):
     }
 
 
-def verify_government_warning(extracted_text):
+def verify_government_warning(extracted_text, text_upper=None):
     """
     Verify if government warning text appears on the label
     
     Args:
         extracted_text (str): OCR extracted text
+        text_upper (str): Already upper-cased extracted text, if available
         
     Returns:
         dict: Verification result
     """
     logger.info("Verifying government warning")
     
-    text_upper = extracted_text.upper()
+    if text_upper is None:
+        text_upper = extracted_text.upper()
     
-    # Check for main warning phrase
-    if "GOVERNMENT WARNING" in text_upper:
-        # Check for additional warning keywords
-        keyword_count = sum(1 for keyword in GOVERNMENT_WARNING_KEYWORDS if keyword in text_upper)
-        
-        if keyword_count >= 2:
-            return {
-                'field': 'Government Warning',
-                'status': 'match',
-                'message': "✓ Government warning statement found on the label."
-            }
-        else:
-            return {
-                'field': 'Government Warning',
-                'status': 'warning',
-                'message': "⚠ 'GOVERNMENT WARNING' found but complete warning text may be incomplete."
-            }
-    else:
+    # Check for main warning phrase before scanning for the other keywords
+    if text_upper.find("GOVERNMENT WARNING") < 0:
         return {
             'field': 'Government Warning',
             'status': 'not_found',
             'message': "✗ Government warning statement not found on the label. This is required by law."
         }
+    
+    # Check for additional warning keywords
+    keyword_count = len(set(GOVERNMENT_WARNING_PATTERN.findall(text_upper)))
+    
+    if keyword_count >= 2:
+        return {
+            'field': 'Government Warning',
+            'status': 'match',
+            'message': "✓ Government warning statement found on the label."
+        }
+    else:
+        return {
+            'field': 'Government Warning',
+            'status': 'warning',
+            'message': "⚠ 'GOVERNMENT WARNING' found but complete warning text may be incomplete."
+        }
 
 
 def verify_label_data(form_data, extracted_text):
@@ -430,25 +519,29 @@ def verify_label_data(form_data, extracted_text):
     
     results = []
     
+    # Normalize the OCR text once and share it across the field checks
+    text_norm = normalize_text(extracted_text)
+    text_upper = extracted_text.upper()
+    
     # Verify Brand Name
     if form_data.get('brand_name'):
-        results.append(verify_brand_name(form_data['brand_name'], extracted_text))
+        results.append(verify_brand_name(form_data['brand_name'], extracted_text, text_norm))
     
     # Verify Product Type
     if form_data.get('product_type'):
-        results.append(verify_product_type(form_data['product_type'], extracted_text))
+        results.append(verify_product_type(form_data['product_type'], extracted_text, text_norm))
     
     # Verify Alcohol Content
     if form_data.get('alcohol_content'):
         results.append(verify_alcohol_content(form_data['alcohol_content'], extracted_text))
     
     # Verify Net Contents (optional)
-    net_contents_result = verify_net_contents(form_data.get('net_contents'), extracted_text)
+    net_contents_result = verify_net_contents(form_data.get('net_contents'), extracted_text, text_norm)
     if net_contents_result:
         results.append(net_contents_result)
     
     # Verify Government Warning (bonus feature)
-    results.append(verify_government_warning(extracted_text))
+    results.append(verify_government_warning(extracted_text, text_upper))
     
     logger.info(f"Verification completed. {len(results)} checks performed.")
     
@@ -0,0 +1,28 @@
+"""
+Gunicorn configuration for running the TTB label verification app in production
+"""
+
+import os
+from dotenv import load_dotenv
+
+# Gunicorn reads its settings before the app loads, so read the .env file here too
+load_dotenv()
+
+# Render provides PORT
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# Threaded workers let each process keep serving requests while other
+# threads wait on Tesseract, since most of a request is spent in OCR
+worker_class = 'gthread'
+# Exported so each worker can size its OCR concurrency cap from the worker count
+workers = int(os.environ.setdefault('WEB_CONCURRENCY', '2'))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Large label photos can take a few seconds to OCR
+timeout = 60
+
+
+def post_worker_init(worker):
+    """Warm up OCR in each worker before it starts accepting requests"""
+    from backend.utils.ocr_processor import warm_up_ocr
+    warm_up_ocr()